@@ -0,0 +1,268 @@
+import asyncio
+import math
+import os
+import threading
+import time
+
+import cv2
+
+from decoder import target_size
+
+# Cost unit: one 640x360 frame, i.e. a 16:9 frame decoded at the default
+# inference size. A full-size 1080p frame costs 9 units.
+REFERENCE_PIXELS = 640 * 360
+
+
+class AdmissionRejected(Exception):
+    """Raised when a job is shed instead of admitted"""
+
+    def __init__(self, status_code, reason, detail, retry_after=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.reason = reason
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def headers(self):
+        if self.retry_after is None:
+            return None
+        return {"Retry-After": str(self.retry_after)}
+
+
+def probe_video(video_path):
+    """
+    Read frame count, resolution and fps from the container without decoding
+
+    Args:
+        video_path (str): Path to the video file
+
+    Returns:
+        dict: frame_count, width, height and fps of the video
+    """
+    cap = cv2.VideoCapture(video_path)
+
+    if not cap.isOpened():
+        raise Exception("Could not open video file")
+
+    info = {
+        "frame_count": max(0, int(cap.get(cv2.CAP_PROP_FRAME_COUNT))),
+        "width": int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)),
+        "height": int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)),
+        "fps": cap.get(cv2.CAP_PROP_FPS) or 0.0,
+    }
+    cap.release()
+
+    return info
+
+
+def estimate_cost(info, max_frames=None, max_side=None):
+    """
+    Estimate the cost of processing a video in reference frames
+
+    Args:
+        info (dict): Output of probe_video
+        max_frames (int): Only this many frames will be processed (default: None)
+        max_side (int): Frames are decoded scaled to this longest side, None for full size (default: None)
+
+    Returns:
+        float: Job cost
+    """
+    frames = info["frame_count"]
+    if max_frames is not None:
+        frames = min(frames, max_frames) if frames > 0 else max_frames
+    # Some containers do not report a frame count; charge at least one frame
+    frames = max(1, frames)
+    width, height = target_size(info["width"], info["height"], max_side)
+    pixels = max(1, width * height)
+    return frames * pixels / REFERENCE_PIXELS
+
+
+class AdmissionController:
+    """
+    Per-instance limits on running jobs, job cost, temp disk and queue time
+
+    A job is admitted only when an execution slot is free, so the whole time a
+    job waits to run is spent in acquire and counts against max_queue_seconds.
+    Concurrency is bounded by max_running alone; decoding keeps only a small
+    pool of frames per job in memory, so job cost is not a resource held while
+    running. It estimates how long a job will occupy its slot, for Retry-After,
+    and a job costing more than max_job_cost is refused with 413 outright.
+    """
+
+    def __init__(self, max_job_cost, max_temp_bytes, max_queue_seconds,
+                 max_queue_length, max_running=1):
+        self.max_job_cost = max_job_cost
+        self.max_temp_bytes = max_temp_bytes
+        self.max_queue_seconds = max_queue_seconds
+        self.max_queue_length = max_queue_length
+        self.max_running = max_running
+
+        self.running_cost = 0.0
+        self.temp_bytes = 0
+        self.queued = 0
+        self.queued_cost = 0.0
+        self.running = 0
+
+        # Smoothed processing time per cost unit, used to estimate Retry-After
+        self.seconds_per_unit = None
+
+        self.counters = {
+            "admitted": 0,
+            "completed": 0,
+            "shed_too_large": 0,
+            "shed_queue_full": 0,
+            "shed_queue_timeout": 0,
+            "shed_temp_disk": 0,
+        }
+        self.queue_wait_seconds_total = 0.0
+
+        # Disk usage is charged from upload handlers and worker threads
+        self._lock = threading.Lock()
+        self._condition = None
+
+    @classmethod
+    def from_env(cls, max_running=1):
+        return cls(
+            # About 9 hours of 30 fps video at the default inference size
+            max_job_cost=float(os.environ.get("MAX_JOB_COST", 1000000)),
+            max_temp_bytes=int(
+                os.environ.get("MAX_TEMP_BYTES", 4 * 1024 ** 3)),
+            max_queue_seconds=float(
+                os.environ.get("MAX_QUEUE_SECONDS", 30)),
+            max_queue_length=int(os.environ.get("MAX_QUEUE_LENGTH", 8)),
+            max_running=max_running,
+        )
+
+    def retry_after(self, cost):
+        """Estimate how many seconds until a job of this cost could start"""
+        if self.seconds_per_unit is None:
+            return max(1, math.ceil(self.max_queue_seconds))
+        # Everything running or queued has to finish first
+        ahead = (self.running_cost + self.queued_cost) / self.max_running
+        return min(600, max(1, math.ceil(ahead * self.seconds_per_unit)))
+
+    def reserve_disk(self, nbytes):
+        if nbytes > self.max_temp_bytes:
+            with self._lock:
+                self.counters["shed_too_large"] += 1
+            raise AdmissionRejected(
+                413, "too_large",
+                f"Upload exceeds the temporary storage budget of this instance "
+                f"({nbytes} > {self.max_temp_bytes} bytes)")
+
+        with self._lock:
+            if self.temp_bytes + nbytes > self.max_temp_bytes:
+                self.counters["shed_temp_disk"] += 1
+                raise AdmissionRejected(
+                    503, "temp_disk", "Temporary storage budget exhausted",
+                    retry_after=max(1, math.ceil(self.max_queue_seconds)))
+            self.temp_bytes += nbytes
+
+    def release_disk(self, nbytes):
+        with self._lock:
+            self.temp_bytes = max(0, self.temp_bytes - nbytes)
+
+    def queue_full(self):
+        """True when a new job would have to queue and the queue has no room"""
+        return self.running >= self.max_running and \
+            self.queued >= self.max_queue_length
+
+    def reject_queue_full(self, cost=0):
+        self.counters["shed_queue_full"] += 1
+        raise AdmissionRejected(
+            429, "queue_full", "Too many queued jobs",
+            retry_after=self.retry_after(cost))
+
+    def _slot_free(self):
+        return self.running < self.max_running
+
+    async def acquire(self, cost):
+        """
+        Wait for a free execution slot
+
+        Args:
+            cost (float): Job cost from estimate_cost
+
+        Returns:
+            float: Seconds spent queued
+
+        Raises:
+            AdmissionRejected: 413 if the job costs more than max_job_cost, 429
+                if the queue is full, 503 if no slot frees up in time
+        """
+        if cost > self.max_job_cost:
+            self.counters["shed_too_large"] += 1
+            raise AdmissionRejected(
+                413, "too_large",
+                f"Video exceeds the maximum job cost of this instance "
+                f"({cost:.0f} > {self.max_job_cost:.0f} frames)")
+
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+
+        start = time.monotonic()
+        async with self._condition:
+            if not self._slot_free():
+                if self.queue_full():
+                    self.reject_queue_full(cost)
+
+                self.queued += 1
+                self.queued_cost += cost
+                try:
+                    await asyncio.wait_for(
+                        self._condition.wait_for(self._slot_free),
+                        timeout=self.max_queue_seconds)
+                except asyncio.TimeoutError:
+                    self.counters["shed_queue_timeout"] += 1
+                    raise AdmissionRejected(
+                        503, "queue_timeout",
+                        "Timed out waiting for processing capacity",
+                        retry_after=self.retry_after(cost))
+                finally:
+                    self.queued -= 1
+                    self.queued_cost -= cost
+
+            self.running_cost += cost
+            self.running += 1
+            self.counters["admitted"] += 1
+
+        waited = time.monotonic() - start
+        self.queue_wait_seconds_total += waited
+        return waited
+
+    async def release(self, cost, elapsed=None):
+        """
+        Return a job's budget and wake up queued jobs
+
+        Args:
+            cost (float): Cost passed to acquire
+            elapsed (float): Processing time of the job, if it completed (default: None)
+        """
+        if elapsed is not None and cost > 0:
+            sample = elapsed / cost
+            if self.seconds_per_unit is None:
+                self.seconds_per_unit = sample
+            else:
+                self.seconds_per_unit = 0.8 * self.seconds_per_unit + 0.2 * sample
+            self.counters["completed"] += 1
+
+        async with self._condition:
+            self.running_cost = max(0.0, self.running_cost - cost)
+            self.running -= 1
+            self._condition.notify_all()
+
+    def metrics(self):
+        return {
+            **self.counters,
+            "running": self.running,
+            "max_running": self.max_running,
+            "queued": self.queued,
+            "queued_cost": round(self.queued_cost, 2),
+            "running_cost": round(self.running_cost, 2),
+            "max_job_cost": self.max_job_cost,
+            "temp_bytes": self.temp_bytes,
+            "max_temp_bytes": self.max_temp_bytes,
+            "queue_wait_seconds_total": round(self.queue_wait_seconds_total, 3),
+            "seconds_per_frame": self.seconds_per_unit,
+        }
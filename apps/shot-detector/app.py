@@ -1,9 +1,15 @@
 import os
-import tempfile
+import time
+from email.utils import formatdate, parsedate_to_datetime
 
-from fastapi import FastAPI, File, HTTPException, UploadFile
-from fastapi.responses import JSONResponse
+from admission import (AdmissionController, AdmissionRejected, estimate_cost,
+                       probe_video)
+from clip_store import ClipStore, parse_range
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
 from shot_detector_api import ShotDetectorAPI
+from uploads import MultipartUploads, UploadError, multipart_body
 
 app = FastAPI(
     title="Basketball Shot Detection API",
@@ -16,36 +22,84 @@ app = FastAPI(
 model_path = os.environ.get("MODEL_PATH", "best.pt")
 detector = ShotDetectorAPI(model_path)
 
+# The detector keeps per-video tracking state, so it is a single execution
+# slot: admission runs one job at a time and the rest wait in its timed queue
+admission = AdmissionController.from_env(max_running=1)
+clip_store = ClipStore.from_env()
 
-@app.post("/detect-shots")
-async def detect_shots(video: UploadFile = File(...)):
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# Inference size for /detect-shots; frames are decoded at this size too
+DETECT_IMGSZ = 640
+
+
+async def receive_uploads(uploads):
+    """Shed before any of the body is read, then stream the uploads to disk"""
+    if admission.queue_full():
+        admission.reject_queue_full()
+    uploads.reserve_content_length()
+    return await uploads.receive()
+
+
+def _run_detector(func, *args, **kwargs):
+    start = time.monotonic()
+    result = func(*args, **kwargs)
+    return result, time.monotonic() - start
+
+
+async def run_admitted(cost, func, *args, **kwargs):
+    """Run a detector method once the job fits the instance budget"""
+    await admission.acquire(cost)
+    elapsed = None
+    try:
+        result, elapsed = await run_in_threadpool(
+            _run_detector, func, *args, **kwargs)
+        return result
+    finally:
+        await admission.release(cost, elapsed)
+
+
+def shed(rejection):
+    return HTTPException(status_code=rejection.status_code,
+                         detail=rejection.detail, headers=rejection.headers)
+
+
+@app.post("/detect-shots", openapi_extra=multipart_body("video"))
+async def detect_shots(request: Request):
     """Upload a video file to detect basketball shots"""
+    uploads = MultipartUploads(request, "video", admission)
     try:
         # Save uploaded video to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
-            content = await video.read()
-            temp_file.write(content)
-            temp_video_path = temp_file.name
+        video = (await receive_uploads(uploads))[0]
+        temp_video_path = video.path
 
-        # Run shot detection
-        result = detector.detect_shots(temp_video_path)
+        # Estimate the job cost from container metadata before decoding
+        cost = estimate_cost(probe_video(temp_video_path), max_side=DETECT_IMGSZ)
 
-        # Clean up temporary file
-        os.unlink(temp_video_path)
+        # Run shot detection
+        result = await run_admitted(cost, detector.detect_shots, temp_video_path,
+                                    imgsz=DETECT_IMGSZ)
 
         return JSONResponse(content=result)
 
-    except Exception as e:
-        # Clean up temporary file if it exists
-        if 'temp_video_path' in locals():
-            try:
-                os.unlink(temp_video_path)
-            except:
-                pass
+    except AdmissionRejected as e:
+        raise shed(e)
 
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error processing video: {str(e)}")
 
+    finally:
+        # Clean up temporary file
+        uploads.cleanup()
+
+
+def clip_response(clip_id):
+    return {"clip_id": clip_id, "clip_url": f"/clips/{clip_id}"}
+
 
 @app.get("/")
 async def root():
@@ -55,7 +109,11 @@ async def root():
         "version": "1.0.0",
         "endpoints": {
             "detect_shots": "/detect-shots",
-            "health": "/health"
+            "generate_shot_clip": "/generate-shot-clip",
+            "generate_highlights": "/generate-highlights",
+            "clips": "/clips/{clip_id}",
+            "health": "/health",
+            "metrics": "/metrics"
         }
     }
 
@@ -66,78 +124,193 @@ async def health_check():
     return {"status": "healthy", "timestamp": "2026-01-14"}
 
 
-@app.post("/generate-shot-clip")
+@app.get("/metrics")
+async def metrics():
+    """Admission control and load shedding metrics"""
+    return admission.metrics()
+
+
+@app.post("/generate-shot-clip", openapi_extra=multipart_body("video"))
 async def generate_shot_clip(
-    video: UploadFile = File(...),
+    request: Request,
     shot_frame: int = 0,
     duration: int = 3
 ):
     """Generate a video clip around a shot frame"""
+    uploads = MultipartUploads(request, "video", admission)
     try:
         # Save uploaded video to temporary file
-        with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
-            content = await video.read()
-            temp_file.write(content)
-            temp_video_path = temp_file.name
+        video = (await receive_uploads(uploads))[0]
+        temp_video_path = video.path
+
+        # The same clip of the same video is only generated once
+        clip_id = ClipStore.key("shot", video.digest, shot_frame, duration)
+        if clip_store.get(clip_id) is not None:
+            return clip_response(clip_id)
+
+        # Only the frames of the clip are decoded, at full size
+        info = probe_video(temp_video_path)
+        cost = estimate_cost(info, max_frames=int(info["fps"] * duration))
 
         # Generate shot clip
-        clip_path = detector.generate_shot_clip(
-            video_path=temp_video_path,
-            shot_frame=shot_frame,
-            duration=duration
+        await run_admitted(
+            cost,
+            clip_store.put,
+            clip_id,
+            lambda output_path: detector.generate_shot_clip(
+                video_path=temp_video_path,
+                shot_frame=shot_frame,
+                duration=duration,
+                output_path=output_path
+            )
         )
 
-        # Clean up temporary file
-        os.unlink(temp_video_path)
+        return clip_response(clip_id)
 
-        return {"clip_path": clip_path}
+    except AdmissionRejected as e:
+        raise shed(e)
 
-    except Exception as e:
-        # Clean up temporary file if it exists
-        if 'temp_video_path' in locals():
-            try:
-                os.unlink(temp_video_path)
-            except:
-                pass
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
+    except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error generating shot clip: {str(e)}")
 
+    finally:
+        # Clean up temporary file
+        uploads.cleanup()
+
 
-@app.post("/generate-highlights")
-async def generate_highlights(
-    clips: list[UploadFile] = File(...)
-):
+@app.post("/generate-highlights",
+          openapi_extra=multipart_body("clips", multiple=True))
+async def generate_highlights(request: Request):
     """Generate a highlights video by merging multiple shot clips"""
+    uploads = MultipartUploads(request, "clips", admission)
     try:
         # Save uploaded clips to temporary files
-        temp_clip_paths = []
-        for clip in clips:
-            with tempfile.NamedTemporaryFile(suffix=".mp4", delete=False) as temp_file:
-                content = await clip.read()
-                temp_file.write(content)
-                temp_clip_paths.append(temp_file.name)
+        clips = await receive_uploads(uploads)
 
-        # Generate highlights video
-        highlights_path = detector.generate_highlights(temp_clip_paths)
+        highlights_id = ClipStore.key(
+            "highlights", *(clip.digest for clip in clips))
+        if clip_store.get(highlights_id) is not None:
+            return clip_response(highlights_id)
 
-        # Clean up temporary files
-        for temp_path in temp_clip_paths:
+        temp_clip_paths = [clip.path for clip in clips]
+        cost = 0
+        for path in temp_clip_paths:
             try:
-                os.unlink(temp_path)
-            except:
-                pass
+                cost += estimate_cost(probe_video(path))
+            except Exception:
+                # generate_highlights skips clips it cannot open
+                continue
 
-        return {"highlights_path": highlights_path}
+        # Generate highlights video
+        await run_admitted(
+            cost,
+            clip_store.put,
+            highlights_id,
+            lambda output_path: detector.generate_highlights(
+                temp_clip_paths, output_path=output_path)
+        )
 
-    except Exception as e:
-        # Clean up temporary files if they exist
-        if 'temp_clip_paths' in locals():
-            for temp_path in temp_clip_paths:
-                try:
-                    os.unlink(temp_path)
-                except:
-                    pass
+        return clip_response(highlights_id)
+
+    except AdmissionRejected as e:
+        raise shed(e)
 
+    except UploadError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    except Exception as e:
         raise HTTPException(
             status_code=500, detail=f"Error generating highlights: {str(e)}")
+
+    finally:
+        # Clean up temporary files
+        uploads.cleanup()
+
+
+def _not_modified(request, etag, last_modified):
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags or f"W/{etag}" in tags
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+
+    return False
+
+
+def _iter_file(f, start, length):
+    with f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(DOWNLOAD_CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+@app.api_route("/clips/{clip_id}", methods=["GET", "HEAD"])
+async def download_clip(clip_id: str, request: Request):
+    """Download a generated clip, with support for Range and conditional requests"""
+    path = clip_store.get(clip_id) if ClipStore.is_key(clip_id) else None
+    if path is None:
+        raise HTTPException(status_code=404, detail="Clip not found")
+
+    # Open once so the validators below describe exactly the bytes streamed,
+    # even if the clip is evicted and regenerated meanwhile. The clip id only
+    # names the inputs; a regenerated clip can differ byte for byte, so the
+    # ETag comes from the stored file instead.
+    f = open(path, "rb")
+    stat = os.fstat(f.fileno())
+    etag = f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+    headers = {
+        "ETag": etag,
+        "Last-Modified": formatdate(stat.st_mtime, usegmt=True),
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, max-age=3600",
+    }
+
+    if _not_modified(request, etag, stat.st_mtime):
+        f.close()
+        return Response(status_code=304, headers=headers)
+
+    size = stat.st_size
+    byte_range = None
+    # Only the strong ETag can validate a partial response; a Last-Modified
+    # date cannot tell apart two clips written within the same second
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range.strip() == etag:
+        try:
+            byte_range = parse_range(request.headers.get("range"), size)
+        except ValueError:
+            f.close()
+            return Response(status_code=416,
+                            headers={**headers, "Content-Range": f"bytes */{size}"})
+
+    status_code = 200
+    start, length = 0, size
+    if byte_range is not None:
+        status_code = 206
+        start, end = byte_range
+        length = end - start + 1
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+    headers["Content-Length"] = str(length)
+
+    # HEAD gets the same status and headers as GET, without the body
+    if request.method == "HEAD":
+        f.close()
+        return Response(status_code=status_code, media_type="video/mp4",
+                        headers=headers)
+
+    return StreamingResponse(_iter_file(f, start, length),
+                             status_code=status_code, media_type="video/mp4",
+                             headers=headers)
@@ -0,0 +1,200 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import uuid
+
+KEY_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+class ClipStore:
+    """Content-addressed store for generated clips with TTL and size-based eviction"""
+
+    def __init__(self, root, max_bytes, ttl_seconds):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        os.makedirs(root, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._key_locks = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            root=os.environ.get("CLIP_STORE_DIR", "clips"),
+            max_bytes=int(os.environ.get("CLIP_STORE_MAX_BYTES", 2 * 1024 ** 3)),
+            ttl_seconds=float(os.environ.get("CLIP_STORE_TTL_SECONDS", 24 * 3600)),
+        )
+
+    @staticmethod
+    def key(*parts):
+        """Build a key from the inputs that determine a clip's content"""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode())
+            digest.update(b"\0")
+        return digest.hexdigest()
+
+    @staticmethod
+    def is_key(key):
+        return bool(KEY_PATTERN.match(key))
+
+    def path(self, key):
+        return os.path.join(self.root, f"{key}.mp4")
+
+    def _expired(self, stat, now):
+        # Access time is refreshed on every hit, so the TTL counts from last use
+        return now - stat.st_atime > self.ttl_seconds
+
+    def _touch(self, path, stat):
+        os.utime(path, (time.time(), stat.st_mtime))
+
+    def get(self, key):
+        """
+        Look up a stored clip
+
+        Args:
+            key (str): Clip key
+
+        Returns:
+            str: Path to the clip, or None if it is missing or expired
+        """
+        path = self.path(key)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+
+        if self._expired(stat, time.time()):
+            self._remove(path)
+            return None
+
+        self._touch(path, stat)
+        return path
+
+    def put(self, key, build):
+        """
+        Store a clip, building it only if it is not stored yet
+
+        Args:
+            key (str): Clip key
+            build (callable): Called with a temporary output path to write the clip to
+
+        Returns:
+            str: Path to the stored clip
+        """
+        # Each key lock counts the callers holding or waiting on it, and is only
+        # dropped by the last one, so every caller for a key shares one lock
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        key_lock = entry[0]
+
+        try:
+            with key_lock:
+                path = self.get(key)
+                if path is not None:
+                    return path
+
+                # Write next to the final path so the rename is atomic; cv2 picks
+                # the container from the extension, so keep .mp4 last
+                temp_path = os.path.join(
+                    self.root, f".{key}.{uuid.uuid4().hex}.mp4")
+                try:
+                    build(temp_path)
+                    # Never cache a failed or empty build under the clip's key
+                    if not os.path.exists(temp_path) or os.path.getsize(temp_path) == 0:
+                        raise Exception("Clip could not be generated")
+                    os.replace(temp_path, self.path(key))
+                finally:
+                    self._remove(temp_path)
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+        self.evict(keep=key)
+        return self.path(key)
+
+    def evict(self, keep=None):
+        """Remove expired clips, then least recently used ones until under max_bytes"""
+        now = time.time()
+        entries = []
+        total = 0
+
+        for name in os.listdir(self.root):
+            key, ext = os.path.splitext(name)
+            if ext != ".mp4" or not self.is_key(key):
+                continue
+            path = os.path.join(self.root, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+
+            if self._expired(stat, now) and key != keep:
+                self._remove(path)
+                continue
+
+            entries.append((stat.st_atime, key, path, stat.st_size))
+            total += stat.st_size
+
+        for _, key, path, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            self._remove(path)
+            total -= size
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range HTTP Range header
+
+    Args:
+        header (str): Value of the Range header
+        size (int): Size of the resource in bytes
+
+    Returns:
+        tuple: Inclusive (start, end) byte positions, or None to serve the whole resource
+
+    Raises:
+        ValueError: If the range cannot be satisfied
+    """
+    match = re.fullmatch(r"\s*bytes=(\d*)-(\d*)\s*", header or "")
+    if match is None:
+        # Unsupported units and multiple ranges fall back to a full response
+        return None
+
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if first and last and int(last) < int(first):
+        # Syntactically invalid, so it is ignored rather than unsatisfiable
+        return None
+
+    if size == 0:
+        raise ValueError("Unsatisfiable range")
+
+    if not first:
+        # Suffix range: the last N bytes
+        length = int(last)
+        if length == 0:
+            raise ValueError("Unsatisfiable range")
+        return max(0, size - length), size - 1
+
+    start = int(first)
+    if start >= size:
+        raise ValueError("Unsatisfiable range")
+    end = min(int(last), size - 1) if last else size - 1
+    return start, end
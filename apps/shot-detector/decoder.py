@@ -0,0 +1,325 @@
+import itertools
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+try:
+    import av
+except ImportError:
+    av = None
+
+# PyAV only reports the display matrix rotation from 14.x; older versions would
+# hand portrait phone videos to the model sideways, so they use OpenCV instead
+HAS_AV = av is not None and hasattr(av.VideoFrame, "rotation")
+
+# Counter-clockwise display rotation -> cv2.rotate code, as OpenCV's auto-rotation applies it
+ROTATE_CODES = {
+    90: cv2.ROTATE_90_COUNTERCLOCKWISE,
+    180: cv2.ROTATE_180,
+    270: cv2.ROTATE_90_CLOCKWISE,
+}
+
+
+def display_rotation(frame):
+    """Counter-clockwise rotation of a PyAV frame's display matrix, as 0, 90, 180 or 270"""
+    if frame is None:
+        return 0
+    return round(frame.rotation / 90) % 4 * 90
+
+
+def target_size(width, height, max_side):
+    """Scale (width, height) so the longest side is at most max_side"""
+    if max_side is None or max(width, height) <= max_side:
+        return width, height
+    scale = max_side / max(width, height)
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class FramePool:
+    """Fixed set of preallocated frame buffers shared by the decoder and the consumer"""
+
+    def __init__(self, shape, size):
+        self._free = queue.Queue()
+        for _ in range(size):
+            self._free.put(np.empty(shape, dtype=np.uint8))
+
+    def acquire(self, stop):
+        # Poll so a stopped reader does not leave the decode thread blocked
+        while not stop.is_set():
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    def release(self, buffer):
+        self._free.put(buffer)
+
+
+class VideoReader:
+    """
+    Decode a video on a background thread, scaled to the inference resolution
+
+    Frames are written into a pool of preallocated BGR buffers and yielded as
+    (frame_index, frame), where frame is a view of the buffer cropped to the
+    ROI. A frame is only valid until the next one is requested, so it can be
+    handed to the model without copying. Use to_source to map coordinates in
+    the yielded frame back to the source video.
+
+    Frames are upright: rotation metadata is applied the same way OpenCV
+    applies it, so sizes, ROIs and coordinates all refer to the displayed
+    orientation, as they do for cv2.VideoCapture.
+    """
+
+    def __init__(self, video_path, max_side=None, frame_stride=1, roi=None,
+                 pool_size=4, backend=None):
+        """
+        Args:
+            video_path (str): Path to the video
+            max_side (int): Longest side of the yielded frames, None for full size (default: None)
+            frame_stride (int): Only yield every n-th frame (default: 1)
+            roi (tuple): (x1, y1, x2, y2) region of the source to yield (default: None)
+            pool_size (int): Number of preallocated buffers (default: 4)
+            backend (str): "av" or "cv2", defaults to "av" when PyAV is installed (default: None)
+        """
+        self.video_path = video_path
+        self.frame_stride = frame_stride
+        self.backend = backend or ("av" if HAS_AV else "cv2")
+        self.frames_read = 0
+        # Rotation the reader applies itself; OpenCV auto-rotates on its own
+        self.rotation = 0
+
+        if self.backend == "av":
+            if not HAS_AV:
+                raise Exception("PyAV is not installed or too old to report frame rotation")
+            self._container = av.open(video_path)
+            self._stream = self._container.streams.video[0]
+            # Let the codec decode slices/frames on its own threads
+            self._stream.thread_type = "AUTO"
+
+            # Rotation is carried on the decoded frames, so peek at the first one
+            self._decoded = self._container.decode(self._stream)
+            self._first_frame = next(self._decoded, None)
+            self.rotation = display_rotation(self._first_frame)
+
+            width = self._stream.codec_context.width
+            height = self._stream.codec_context.height
+            if self.rotation in (90, 270):
+                width, height = height, width
+        else:
+            self._cap = cv2.VideoCapture(video_path)
+            if not self._cap.isOpened():
+                raise Exception("Could not open video file")
+            width = int(self._cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(self._cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+        self.source_size = (width, height)
+        if roi is None:
+            roi = (0, 0, width, height)
+        crop_width, crop_height = roi[2] - roi[0], roi[3] - roi[1]
+
+        # Scale the whole frame so the ROI ends up max_side on its longest side
+        crop_size = target_size(crop_width, crop_height, max_side)
+        self.scale = (crop_width / crop_size[0], crop_height / crop_size[1])
+        self.offset = (roi[0], roi[1])
+        self.size = (round(width / self.scale[0]), round(height / self.scale[1]))
+
+        left = round(roi[0] / self.scale[0])
+        top = round(roi[1] / self.scale[1])
+        self._crop = (slice(top, top + crop_size[1]),
+                      slice(left, left + crop_size[0]))
+
+        self._pool = FramePool((self.size[1], self.size[0], 3), pool_size)
+        self._frames = queue.Queue(maxsize=pool_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._closed = False
+
+    def __iter__(self):
+        self._thread = threading.Thread(target=self._decode, daemon=True)
+        self._thread.start()
+
+        previous = None
+        try:
+            while True:
+                item = self._frames.get()
+                if previous is not None:
+                    self._pool.release(previous)
+                    previous = None
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                index, previous = item
+                yield index, previous[self._crop]
+        finally:
+            self.close()
+
+    def to_source(self, x, y):
+        """Map a point in the yielded frames to source video coordinates"""
+        return (int(self.offset[0] + x * self.scale[0]),
+                int(self.offset[1] + y * self.scale[1]))
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            # Unblock the decode thread if it is waiting for space in the queue
+            while self._thread.is_alive():
+                try:
+                    self._frames.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+            self._thread = None
+
+        if self.backend == "av":
+            self._container.close()
+        else:
+            self._cap.release()
+
+    def _put(self, item):
+        while not self._stop.is_set():
+            try:
+                self._frames.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _decode(self):
+        try:
+            if self.backend == "av":
+                self._decode_av()
+            else:
+                self._decode_cv2()
+            self._put(None)
+        except Exception as e:
+            self._put(e)
+
+    def _decode_av(self):
+        width, height = self.size
+        rotate = ROTATE_CODES.get(self.rotation)
+        # swscale works in coded orientation; the pool buffers are upright
+        if self.rotation in (90, 270):
+            width, height = height, width
+
+        frames = self._decoded
+        if self._first_frame is not None:
+            frames = itertools.chain([self._first_frame], frames)
+            self._first_frame = None
+
+        for index, frame in enumerate(frames):
+            if self._stop.is_set():
+                return
+            self.frames_read = index + 1
+            if index % self.frame_stride != 0:
+                continue
+
+            buffer = self._pool.acquire(self._stop)
+            if buffer is None:
+                return
+
+            # swscale converts and resizes in one pass; rows may be padded
+            scaled = frame.reformat(width=width, height=height, format="bgr24")
+            plane = scaled.planes[0]
+            rows = np.frombuffer(plane, dtype=np.uint8).reshape(
+                height, plane.line_size)
+            image = rows[:, :width * 3].reshape(height, width, 3)
+            if rotate is None:
+                np.copyto(buffer, image)
+            else:
+                cv2.rotate(image, rotate, dst=buffer)
+
+            if not self._put((index, buffer)):
+                return
+
+    def _decode_cv2(self):
+        width, height = self.size
+        resize = self.size != self.source_size
+        # Full-size frames are decoded into one reused buffer, then resized into the pool
+        full = np.empty((self.source_size[1], self.source_size[0], 3),
+                        dtype=np.uint8) if resize else None
+
+        index = 0
+        while not self._stop.is_set():
+            if index % self.frame_stride != 0:
+                if not self._cap.grab():
+                    return
+                index += 1
+                self.frames_read = index
+                continue
+
+            buffer = self._pool.acquire(self._stop)
+            if buffer is None:
+                return
+
+            target = full if resize else buffer
+            ret, frame = self._cap.read(target)
+            if not ret:
+                self._pool.release(buffer)
+                return
+            if frame is not target:
+                # Some backends ignore the output buffer
+                np.copyto(target, frame)
+            if resize:
+                cv2.resize(full, (width, height), dst=buffer,
+                           interpolation=cv2.INTER_LINEAR)
+
+            if not self._put((index, buffer)):
+                return
+            index += 1
+            self.frames_read = index
+
+
+def benchmark(video_path, max_side=640, frame_stride=1):
+    """
+    Measure decode-only frames/sec of the plain cv2.VideoCapture.read() loop
+    against VideoReader backends
+
+    Returns:
+        dict: fps per decode path
+    """
+    results = {}
+
+    cap = cv2.VideoCapture(video_path)
+    frames = 0
+    start = time.perf_counter()
+    while True:
+        ret, _ = cap.read()
+        if not ret:
+            break
+        frames += 1
+    results["cv2 read (full size)"] = frames / (time.perf_counter() - start)
+    cap.release()
+
+    backends = ["cv2"] + (["av"] if av is not None else [])
+    for backend in backends:
+        for side in (None, max_side):
+            reader = VideoReader(video_path, max_side=side,
+                                 frame_stride=frame_stride, backend=backend)
+            start = time.perf_counter()
+            for _ in reader:
+                pass
+            elapsed = time.perf_counter() - start
+            label = f"{backend} reader ({'full size' if side is None else side})"
+            results[label] = reader.frames_read / elapsed
+
+    return results
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark video decoding")
+    parser.add_argument("video", help="Video to decode")
+    parser.add_argument("--max-side", type=int, default=640,
+                        help="Longest side of downscaled frames")
+    args = parser.parse_args()
+
+    for name, fps in benchmark(args.video, args.max_side).items():
+        print(f"{name:<28}{fps:10.1f} fps")
@@ -0,0 +1,300 @@
+"""
+Accuracy-versus-speed evaluation of ShotDetectorAPI.detect_shots configurations
+
+Annotations file (JSON):
+
+    {"videos": [{"path": "game1.mp4",
+                 "shots": [{"frame": 412, "is_make": true}, ...]}, ...]}
+
+Configurations file (JSON), either a list of detect_shots keyword sets or a
+grid of value lists that is expanded into every combination. A "model" key
+selects a different weights file, e.g. an INT8 export:
+
+    {"imgsz": [320, 480, 640], "half": [false, true], "frame_stride": [1, 2]}
+
+In a grid, "roi" alternatives are nested lists, e.g. [[0, 0, 1280, 720], null];
+a single flat [x1, y1, x2, y2] is taken as one value, not four.
+
+A configuration that fails on any video is reported as a failed row; the
+rest of the sweep still runs.
+
+Usage:
+
+    python evaluate.py annotations.json --configs configs.json --workers 2
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_CONFIGS = [{}]
+
+# One detector per (model path, half), per worker process: ultralytics fixes
+# the predictor's precision when it is first set up and ignores later changes
+_detectors = {}
+
+
+def load_annotations(path):
+    with open(path) as f:
+        data = json.load(f)
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    videos = []
+    for video in data["videos"]:
+        video_path = video["path"]
+        if not os.path.isabs(video_path):
+            video_path = os.path.join(base_dir, video_path)
+        videos.append({"path": video_path, "shots": video["shots"]})
+
+    if not videos:
+        raise ValueError(f"No videos in annotations file {path}")
+
+    return videos
+
+
+def load_configs(path):
+    if path is None:
+        return DEFAULT_CONFIGS
+
+    with open(path) as f:
+        data = json.load(f)
+
+    if isinstance(data, list):
+        return data
+
+    # Grid: expand every combination of the listed values
+    keys = list(data)
+    values = [_grid_values(k, v) for k, v in data.items()]
+    return [dict(zip(keys, combo)) for combo in itertools.product(*values)]
+
+
+def _grid_values(key, value):
+    if not isinstance(value, list):
+        return [value]
+    # A flat [x1, y1, x2, y2] is one ROI, not four alternatives
+    if key == "roi" and len(value) == 4 and \
+            all(isinstance(v, (int, float)) for v in value):
+        return [value]
+    return value
+
+
+def config_name(config):
+    if not config:
+        return "default"
+    return " ".join(f"{k}={v}" for k, v in config.items())
+
+
+def match_events(predicted, truth, tolerance):
+    """
+    Greedily match predicted frames to ground-truth frames within a tolerance
+
+    Args:
+        predicted (list): Predicted event frames
+        truth (list): Ground-truth event frames
+        tolerance (int): Maximum frame distance for a match
+
+    Returns:
+        int: Number of matched pairs
+    """
+    pairs = sorted(
+        (abs(p - t), i, j)
+        for i, p in enumerate(predicted)
+        for j, t in enumerate(truth)
+        if abs(p - t) <= tolerance
+    )
+
+    used_predicted = set()
+    used_truth = set()
+    for _, i, j in pairs:
+        if i in used_predicted or j in used_truth:
+            continue
+        used_predicted.add(i)
+        used_truth.add(j)
+
+    return len(used_predicted)
+
+
+def _get_detector(model_path, half=False, imgsz=640):
+    key = (model_path, bool(half))
+    if key not in _detectors:
+        import numpy as np
+        from shot_detector_api import ShotDetectorAPI
+
+        detector = ShotDetectorAPI(model_path)
+        # Untimed warmup so predictor setup is not charged to the first job
+        detector.model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8),
+                       device=detector.device, imgsz=imgsz, half=bool(half),
+                       verbose=False)
+        _detectors[key] = detector
+    return _detectors[key]
+
+
+def run_job(model_path, config, video):
+    """Run one configuration on one video and count matches against ground truth"""
+    detector = _get_detector(config.get("model", model_path),
+                             half=config.get("half", False),
+                             imgsz=config.get("imgsz", 640))
+    kwargs = {k: v for k, v in config.items() if k not in ("model", "tolerance")}
+    if "roi" in kwargs and kwargs["roi"] is not None:
+        kwargs["roi"] = tuple(kwargs["roi"])
+
+    start = time.perf_counter()
+    result = detector.detect_shots(video["path"], **kwargs)
+    elapsed = time.perf_counter() - start
+
+    return {
+        "predicted_attempts": [e["frame"] for e in result["shot_events"]],
+        "predicted_makes": [e["frame"] for e in result["shot_events"] if e["is_make"]],
+        "true_attempts": [s["frame"] for s in video["shots"]],
+        "true_makes": [s["frame"] for s in video["shots"] if s["is_make"]],
+        "frames": result["frames"],
+        "seconds": elapsed,
+    }
+
+
+def _ratio(a, b):
+    return a / b if b else 0.0
+
+
+def _f1(precision, recall):
+    return _ratio(2 * precision * recall, precision + recall)
+
+
+def summarize(config, runs, tolerance):
+    tolerance = config.get("tolerance", tolerance)
+    row = {"config": config_name(config)}
+
+    for kind in ("attempts", "makes"):
+        predicted = sum(len(r[f"predicted_{kind}"]) for r in runs)
+        truth = sum(len(r[f"true_{kind}"]) for r in runs)
+        matched = sum(
+            match_events(r[f"predicted_{kind}"], r[f"true_{kind}"], tolerance)
+            for r in runs)
+        precision = _ratio(matched, predicted)
+        recall = _ratio(matched, truth)
+        row[f"{kind}_precision"] = precision
+        row[f"{kind}_recall"] = recall
+        row[f"{kind}_f1"] = _f1(precision, recall)
+
+    frames = sum(r["frames"] for r in runs)
+    seconds = sum(r["seconds"] for r in runs)
+    latencies = sorted(r["seconds"] for r in runs)
+    row["fps"] = _ratio(frames, seconds)
+    row["ms_per_frame"] = _ratio(seconds * 1000, frames)
+    row["p95_video_seconds"] = latencies[min(len(latencies) - 1,
+                                             int(0.95 * len(latencies)))]
+    return row
+
+
+def pareto_front(rows, objectives=("attempts_f1", "makes_f1", "fps")):
+    """Mark rows that no other row beats on every objective"""
+    for row in rows:
+        row["pareto"] = not any(
+            all(other[k] >= row[k] for k in objectives) and
+            any(other[k] > row[k] for k in objectives)
+            for other in rows if other is not row
+        )
+    return rows
+
+
+def print_table(rows):
+    failed = [row for row in rows if "error" in row]
+    rows = [row for row in rows if "error" not in row]
+
+    columns = [
+        ("pareto", "*", lambda v: "*" if v else ""),
+        ("attempts_precision", "att P", "{:.3f}".format),
+        ("attempts_recall", "att R", "{:.3f}".format),
+        ("makes_precision", "make P", "{:.3f}".format),
+        ("makes_recall", "make R", "{:.3f}".format),
+        ("fps", "fps", "{:.1f}".format),
+        ("ms_per_frame", "ms/frame", "{:.1f}".format),
+        ("p95_video_seconds", "p95 video s", "{:.1f}".format),
+        ("config", "config", str),
+    ]
+
+    cells = [[fmt(row[key]) for key, _, fmt in columns] for row in rows]
+    headers = [title for _, title, _ in columns]
+    widths = [max([len(h), *(len(c[i]) for c in cells)])
+              for i, h in enumerate(headers)]
+
+    print("  ".join(h.ljust(w) for h, w in zip(headers, widths)))
+    for line in cells:
+        print("  ".join(c.ljust(w) for c, w in zip(line, widths)))
+
+    if failed:
+        print("\nFailed:")
+        for row in failed:
+            print(f"  {row['config']}: {row['error']}")
+
+
+def evaluate(annotations_path, configs_path=None, model_path="best.pt",
+             workers=1, tolerance=30):
+    """
+    Sweep detector configurations over annotated videos
+
+    Args:
+        annotations_path (str): Path to the ground-truth annotations file
+        configs_path (str): Path to the configurations file (default: None)
+        model_path (str): Default model weights (default: "best.pt")
+        workers (int): Number of worker processes (default: 1)
+        tolerance (int): Frames between a predicted and a true shot to count as a match (default: 30)
+
+    Returns:
+        list: One summary row per configuration, sorted by fps, followed by
+            rows with an "error" for configurations that failed
+    """
+    videos = load_annotations(annotations_path)
+    configs = load_configs(configs_path)
+
+    jobs = [(i, config, video)
+            for i, config in enumerate(configs) for video in videos]
+    runs = [[] for _ in configs]
+    errors = [[] for _ in configs]
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [(i, video, executor.submit(run_job, model_path, config, video))
+                   for i, config, video in jobs]
+        for i, video, future in futures:
+            try:
+                runs[i].append(future.result())
+            except Exception as e:
+                errors[i].append(
+                    f"{os.path.basename(video['path'])}: {type(e).__name__}: {e}")
+
+    rows = [summarize(config, runs[i], tolerance)
+            for i, config in enumerate(configs) if not errors[i]]
+    failed = [{"config": config_name(config), "error": "; ".join(errors[i])}
+              for i, config in enumerate(configs) if errors[i]]
+
+    pareto_front(rows)
+    rows.sort(key=lambda row: row["fps"], reverse=True)
+    return rows + failed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Measure shot detection accuracy against speed for detector configurations")
+    parser.add_argument("annotations", help="Ground-truth annotations JSON")
+    parser.add_argument("--configs", help="Configurations JSON (list or grid)")
+    parser.add_argument("--model", default=os.environ.get("MODEL_PATH", "best.pt"),
+                        help="Default model weights")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Parallel worker processes; fps is measured under this contention")
+    parser.add_argument("--tolerance", type=int, default=30,
+                        help="Frame tolerance when matching predicted to true shots")
+    parser.add_argument("--json", help="Also write the result rows to this file")
+    args = parser.parse_args()
+
+    rows = evaluate(args.annotations, args.configs, args.model,
+                    args.workers, args.tolerance)
+
+    # Written first so the rows are kept even if printing them fails
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(rows, f, indent=2)
+
+    print_table(rows)
@@ -1,7 +1,9 @@
 import math
+import os
 
 import cv2
 import numpy as np
+from decoder import VideoReader
 from shot_detector import ShotDetector
 from utils import in_hoop_region
 
@@ -12,11 +14,31 @@ class ShotDetectorAPI(ShotDetector):
         # video_path 传入空字符串，因为我们会在 detect_shots 方法中动态设置
         super().__init__(model_path=model_path, video_path="")
 
-    def detect_shots(self, video_path):
-        cap = cv2.VideoCapture(video_path)
+    def detect_shots(self, video_path, imgsz=640, half=False, frame_stride=1,
+                     roi=None, ball_conf=0.3, ball_conf_near_hoop=0.15,
+                     hoop_conf=0.5, scale_decode=True):
+        """
+        Detect shot attempts and makes in a video
 
-        if not cap.isOpened():
-            raise Exception("Could not open video file")
+        Args:
+            video_path (str): Path to the video
+            imgsz (int): Inference size passed to the model (default: 640)
+            half (bool): Run inference in FP16 (default: False)
+            frame_stride (int): Run inference on every n-th frame only (default: 1)
+            roi (tuple): (x1, y1, x2, y2) crop to run inference on (default: None)
+            ball_conf (float): Minimum ball confidence (default: 0.3)
+            ball_conf_near_hoop (float): Minimum ball confidence near the hoop (default: 0.15)
+            hoop_conf (float): Minimum hoop confidence (default: 0.5)
+            scale_decode (bool): Decode straight to imgsz instead of full size (default: True)
+
+        Returns:
+            dict: Shot totals, shot events and the number of frames read
+        """
+        # The model resizes to imgsz anyway, so decode at that size; detections
+        # are mapped back to source coordinates below
+        reader = VideoReader(video_path,
+                             max_side=imgsz if scale_decode else None,
+                             frame_stride=frame_stride, roi=roi)
 
         # 重置父类的状态
         self.ball_pos = []
@@ -31,21 +53,19 @@ class ShotDetectorAPI(ShotDetector):
 
         shot_events = []
 
-        while True:
-            ret, frame = cap.read()
-
-            if not ret:
-                # End of the video or an error occurred
-                break
+        for frame_index, frame in reader:
+            self.frame_count = frame_index
 
-            results = self.model(frame, stream=True, device=self.device)
+            results = self.model(frame, stream=True, device=self.device,
+                                 imgsz=imgsz, half=half)
 
             for r in results:
                 boxes = r.boxes
                 for box in boxes:
-                    # Bounding box
+                    # Bounding box, in source frame coordinates
                     x1, y1, x2, y2 = box.xyxy[0]
-                    x1, y1, x2, y2 = int(x1), int(y1), int(x2), int(y2)
+                    x1, y1 = reader.to_source(float(x1), float(y1))
+                    x2, y2 = reader.to_source(float(x2), float(y2))
                     w, h = x2 - x1, y2 - y1
 
                     # Confidence
@@ -58,12 +78,12 @@ class ShotDetectorAPI(ShotDetector):
                     center = (int(x1 + w / 2), int(y1 + h / 2))
 
                     # Only create ball points if high confidence or near hoop
-                    if (conf > .3 or (in_hoop_region(center, self.hoop_pos) and conf > 0.15)) and current_class == "Basketball":
+                    if (conf > ball_conf or (in_hoop_region(center, self.hoop_pos) and conf > ball_conf_near_hoop)) and current_class == "Basketball":
                         self.ball_pos.append(
                             (center, self.frame_count, w, h, conf))
 
                     # Create hoop points if high confidence
-                    if conf > .5 and current_class == "Basketball Hoop":
+                    if conf > hoop_conf and current_class == "Basketball Hoop":
                         self.hoop_pos.append(
                             (center, self.frame_count, w, h, conf))
 
@@ -92,7 +112,8 @@ class ShotDetectorAPI(ShotDetector):
                         self.down_frame = self.frame_count
 
                 # If ball goes from 'up' area to 'down' area in that order, increase attempt and reset
-                if self.frame_count % 10 == 0:
+                # (checked every 10 frames, on whichever processed frame crosses the boundary)
+                if self.frame_count % 10 < frame_stride:
                     if self.up and self.down and self.up_frame < self.down_frame:
                         self.attempts += 1
                         self.up = False
@@ -111,9 +132,7 @@ class ShotDetectorAPI(ShotDetector):
                             "makes": self.makes
                         })
 
-            self.frame_count += 1
-
-        cap.release()
+        self.frame_count = reader.frames_read
 
         # Calculate shooting percentage
         shooting_percentage = (
@@ -123,7 +142,8 @@ class ShotDetectorAPI(ShotDetector):
             "total_attempts": self.attempts,
             "total_makes": self.makes,
             "shooting_percentage": round(shooting_percentage, 2),
-            "shot_events": shot_events
+            "shot_events": shot_events,
+            "frames": self.frame_count
         }
 
     def generate_shot_clip(self, video_path, shot_frame, duration=3, output_path=None):
@@ -157,7 +177,6 @@ class ShotDetectorAPI(ShotDetector):
 
         # Generate output path if not provided
         if output_path is None:
-            import os
             base_name = os.path.splitext(os.path.basename(video_path))[0]
             output_path = f"{base_name}_shot_{shot_frame}.mp4"
 
@@ -180,6 +199,13 @@ class ShotDetectorAPI(ShotDetector):
         cap.release()
         out.release()
 
+        # A clip with no frames is only a container header; don't hand it out
+        if current_frame == start_frame:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+            raise Exception(
+                f"Shot frame {shot_frame} is beyond the end of the video")
+
         return output_path
 
     def generate_highlights(self, clip_paths, output_path="highlights.mp4"):
@@ -211,6 +237,7 @@ class ShotDetectorAPI(ShotDetector):
         out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
 
         # Process each clip
+        frames_written = 0
         for clip_path in clip_paths:
             cap = cv2.VideoCapture(clip_path)
             if not cap.isOpened():
@@ -222,10 +249,16 @@ class ShotDetectorAPI(ShotDetector):
                 if not ret:
                     break
                 out.write(frame)
+                frames_written += 1
 
             cap.release()
 
         # Release resources
         out.release()
 
+        if frames_written == 0:
+            if os.path.exists(output_path):
+                os.unlink(output_path)
+            raise Exception("No frames could be read from the clips")
+
         return output_path
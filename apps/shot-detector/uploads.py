@@ -0,0 +1,189 @@
+import hashlib
+import os
+import tempfile
+
+try:
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:
+    from multipart.exceptions import MultipartParseError
+    from multipart.multipart import MultipartParser, parse_options_header
+
+
+class UploadError(Exception):
+    """Raised when a request body is not a usable multipart upload"""
+
+
+class Upload:
+    """A file part of a multipart body, streamed to a temporary file"""
+
+    def __init__(self, suffix=".mp4"):
+        self._file = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        self.path = self._file.name
+        self.size = 0
+        self._digest = hashlib.sha256()
+
+    @property
+    def digest(self):
+        return self._digest.hexdigest()
+
+    def write(self, data):
+        self._file.write(data)
+        self._digest.update(data)
+        self.size += len(data)
+
+    def close(self):
+        self._file.close()
+
+    def remove(self):
+        self.close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class MultipartUploads:
+    """
+    Stream the file parts of a multipart/form-data request straight to disk
+
+    The body is read from request.stream(), so nothing is spooled before the
+    handler runs and each upload exists on disk exactly once. Disk usage is
+    reserved from the admission controller up front from Content-Length, or
+    chunk by chunk when the request has no length.
+    """
+
+    def __init__(self, request, field_name, admission):
+        self.request = request
+        self.field_name = field_name
+        self.admission = admission
+        self.uploads = []
+        self.reserved = 0
+        self._length_reserved = False
+
+    def _reserve(self, nbytes):
+        self.admission.reserve_disk(nbytes)
+        self.reserved += nbytes
+
+    def reserve_content_length(self):
+        """Reserve disk for the whole body before any of it is read"""
+        content_length = self.request.headers.get("content-length")
+        if content_length is None:
+            return
+        try:
+            nbytes = int(content_length)
+        except ValueError:
+            raise UploadError("Invalid Content-Length header")
+        self._reserve(nbytes)
+        self._length_reserved = True
+
+    async def receive(self):
+        """
+        Read the request body
+
+        Returns:
+            list: One Upload per file part named field_name, in request order
+        """
+        content_type, params = parse_options_header(
+            self.request.headers.get("content-type", ""))
+        boundary = params.get(b"boundary")
+        if content_type != b"multipart/form-data" or not boundary:
+            raise UploadError("Expected a multipart/form-data body")
+
+        field_name = self.field_name.encode()
+        state = {"headers": [], "field": b"", "value": b"", "upload": None,
+                 "complete": False}
+
+        def on_part_begin():
+            state["headers"] = []
+            state["upload"] = None
+
+        def on_header_field(data, start, end):
+            state["field"] += data[start:end]
+
+        def on_header_value(data, start, end):
+            state["value"] += data[start:end]
+
+        def on_header_end():
+            state["headers"].append((state["field"].lower(), state["value"]))
+            state["field"] = b""
+            state["value"] = b""
+
+        def on_headers_finished():
+            disposition = dict(state["headers"]).get(b"content-disposition", b"")
+            _, options = parse_options_header(disposition)
+            # Only file parts of the expected field are kept; other fields are skipped
+            if options.get(b"name") == field_name and b"filename" in options:
+                state["upload"] = Upload()
+                self.uploads.append(state["upload"])
+
+        def on_part_data(data, start, end):
+            if state["upload"] is not None:
+                state["upload"].write(data[start:end])
+
+        def on_part_end():
+            if state["upload"] is not None:
+                state["upload"].close()
+                state["upload"] = None
+
+        def on_end():
+            state["complete"] = True
+
+        parser = MultipartParser(boundary, {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+            "on_part_end": on_part_end,
+            "on_end": on_end,
+        })
+
+        try:
+            async for chunk in self.request.stream():
+                if not self._length_reserved and chunk:
+                    self._reserve(len(chunk))
+                parser.write(chunk)
+            parser.finalize()
+        except MultipartParseError as e:
+            raise UploadError(f"Malformed multipart body: {e}")
+
+        # finalize does not check for the closing boundary, so a truncated body
+        # would otherwise pass with its last upload cut short
+        if not state["complete"]:
+            raise UploadError("Incomplete multipart body")
+
+        if not self.uploads:
+            raise UploadError(f"Missing file field '{self.field_name}'")
+
+        return self.uploads
+
+    def cleanup(self):
+        """Remove the temporary files and return the reserved disk budget"""
+        for upload in self.uploads:
+            upload.remove()
+        self.uploads = []
+        self.admission.release_disk(self.reserved)
+        self.reserved = 0
+
+
+def multipart_body(field_name, multiple=False):
+    """OpenAPI request body for endpoints that read their uploads with MultipartUploads"""
+    file_schema = {"type": "string", "format": "binary"}
+    if multiple:
+        file_schema = {"type": "array", "items": file_schema}
+    return {
+        "requestBody": {
+            "required": True,
+            "content": {
+                "multipart/form-data": {
+                    "schema": {
+                        "type": "object",
+                        "properties": {field_name: file_schema},
+                        "required": [field_name],
+                    }
+                }
+            },
+        }
+    }